@@ -1,29 +1,55 @@
 #!/usr/bin/env python3
 import argparse
 import re
-import statistics
-from collections import defaultdict
+import numpy as np
+import scipy.sparse as sp
 from google.cloud import storage
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+try:
+    from numba import config as numba_config, get_num_threads, njit, prange, set_num_threads
+    HAVE_NUMBA = True
+except ImportError:  # Numba is optional, fall back to SciPy
+    HAVE_NUMBA = False
+    prange = range
+    def njit(*args, **kwargs):
+        return lambda func: func
+
+# Pattern to match: <a HREF="NUMBER.html">
+# Kept on Python's re: the literal "<a HREF=" prefix lets it skip through the
+# body quickly, and on generated pages it runs ~9x faster than google-re2
+_LINK_RE = re.compile(rb'<a HREF="(\d+)\.html">')
+
+# Stands in for link numbers too large for int32: still a link, but never a page we have
+_MISSING_PAGE = -1
+
 def download_file(bucket, blob_name):
-    """Download a single file from GCS with retry logic"""
+    """Download a single file from GCS with retry logic and extract its links"""
+    # Parse the page number from "NUMBER.html" up front; a bad name is not worth retrying
+    try:
+        page_id = int(blob_name[:-5])
+    except ValueError:
+        raise ValueError(f"{blob_name}: expected a file named NUMBER.html") from None
+    
+    # Only the download is retried; parsing happens once, after it succeeds
     max_retries = 3
     for attempt in range(max_retries):
         try:
             blob = bucket.blob(blob_name)
-            content = blob.download_as_text(timeout=60)
-            return blob_name, content
+            content = blob.download_as_bytes(timeout=60)
+            break
         except Exception as e:
             if attempt < max_retries - 1:
                 print(f"Retry {attempt + 1} for {blob_name}: {str(e)[:50]}")
                 time.sleep(2 ** attempt)  # Exponential backoff
             else:
-                raise
+                raise RuntimeError(f"{blob_name}: {e}") from e
+    
+    return page_id, parse_links(content)
 
-def download_files_parallel(bucket_name, max_workers=20):
-    """Download all HTML files from GCS bucket in parallel"""
+def download_files_parallel(bucket_name, max_workers=64):
+    """Download and parse all HTML files from GCS bucket in parallel"""
     print(f"Downloading files from gs://{bucket_name}...")
     start_time = time.time()
     
@@ -34,8 +60,8 @@ def download_files_parallel(bucket_name, max_workers=20):
     print("Listing files in bucket...")
     html_blobs = []
     try:
-        # Use page iterator with smaller page size to avoid timeout
-        for blob in bucket.list_blobs(timeout=300, page_size=1000):
+        # Use page iterator with smaller page size to avoid timeout; only fetch names
+        for blob in bucket.list_blobs(timeout=300, page_size=1000, fields="items(name),nextPageToken"):
             if blob.name.endswith('.html'):
                 html_blobs.append(blob.name)
             if len(html_blobs) % 5000 == 0 and len(html_blobs) > 0:
@@ -48,99 +74,129 @@ def download_files_parallel(bucket_name, max_workers=20):
     
     print(f"Found {len(html_blobs)} HTML files")
     
-    files_content = {}
+    # Only (page_id, outgoing links) is kept; HTML bodies are dropped after parsing
+    results = []
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {executor.submit(download_file, bucket, blob_name): blob_name 
-                   for blob_name in html_blobs}
+        futures = [executor.submit(download_file, bucket, blob_name) for blob_name in html_blobs]
         
         completed = 0
         failed = 0
         for future in as_completed(futures):
             try:
-                blob_name, content = future.result()
-                files_content[blob_name] = content
+                results.append(future.result())
                 completed += 1
                 if completed % 1000 == 0:
                     print(f"Downloaded {completed}/{len(html_blobs)} files...")
             except Exception as e:
                 failed += 1
                 if failed < 10:  # Only print first 10 errors
-                    print(f"Failed to download a file: {str(e)[:100]}")
+                    print(f"Failed to download {str(e)[:100]}")
     
     elapsed = time.time() - start_time
     print(f"Download completed in {elapsed:.2f} seconds")
     print(f"Successfully downloaded: {completed}, Failed: {failed}")
     
-    return files_content
+    return results
 
 def parse_links(html_content):
-    """Extract outgoing links from HTML content"""
-    # Pattern to match: <a HREF="NUMBER.html">
-    pattern = r'<a HREF="(\d+)\.html">'
-    links = re.findall(pattern, html_content)
-    return [int(link) for link in links]
+    """Extract outgoing links from raw HTML bytes as an int32 array"""
+    links = _LINK_RE.findall(html_content)
+    try:
+        return np.fromiter(map(int, links), dtype=np.int32, count=len(links))
+    except OverflowError:
+        # A link number beyond int32 can't be a downloaded page; keep it as a missing one
+        limit = np.iinfo(np.int32).max
+        return np.fromiter((link if link <= limit else _MISSING_PAGE for link in map(int, links)),
+                           dtype=np.int32, count=len(links))
 
-def build_graph(files_content):
-    """Build graph structure from files"""
+def build_graph(results):
+    """Build CSR (outgoing) and CSC (incoming) graph structure from (page_id, outgoing links) pairs"""
     print("Building graph structure...")
     
-    graph = defaultdict(list)  # outgoing links: graph[page] = [list of pages it links to]
-    incoming = defaultdict(list)  # incoming links: incoming[page] = [list of pages linking to it]
-    
-    # Extract page numbers from filenames
-    pages = set()
-    for filename in files_content.keys():
-        # Extract number from "NUMBER.html"
-        page_num = int(filename.replace('.html', ''))
-        pages.add(page_num)
-    
-    # Parse all links
-    for filename, content in files_content.items():
-        page_num = int(filename.replace('.html', ''))
-        outgoing_links = parse_links(content)
-        graph[page_num] = outgoing_links
-        
-        # Build incoming links
-        for target in outgoing_links:
-            incoming[target].append(page_num)
-    
-    return graph, incoming, pages
+    # Order pages by page number so that dense ids 0..n-1 follow page order
+    n = len(results)
+    page_ids = np.fromiter((page_id for page_id, _ in results), dtype=np.int64, count=n)
+    order = np.argsort(page_ids)
+    page_ids = page_ids[order]
+    link_arrays = [results[i][1] for i in order.tolist()]
+    
+    # Structure-of-arrays graph: int32 link counts, CSR and CSC vectors keyed by dense id.
+    # link_counts is every link in the HTML (used for statistics); outdeg only counts
+    # links to downloaded pages (used for PageRank transition weights).
+    link_counts = np.fromiter(map(len, link_arrays), dtype=np.int32, count=n)
+    outdeg = link_counts
+    # Pre-sized from the per-page lengths: one O(E) copy, never a growing append
+    links = np.concatenate(link_arrays) if n else np.empty(0, np.int32)
+    sources = np.repeat(np.arange(n, dtype=np.int32), link_counts)
+    
+    # Map link targets to dense ids (links to pages we don't have are dropped)
+    if n and page_ids[0] == 0 and page_ids[-1] == n - 1:
+        # Pages are numbered 0..n-1 already, so the page number is the dense id
+        targets = links
+        valid = (links >= 0) & (links < n)
+    else:
+        targets = np.searchsorted(page_ids, links).astype(np.int32)
+        valid = targets < n
+        valid[valid] = page_ids[targets[valid]] == links[valid]
+    if not valid.all():
+        sources, targets = sources[valid], targets[valid]
+        outdeg = np.bincount(sources, minlength=n).astype(np.int32)
+    
+    # CSR layout: outgoing links of page i are out_indices[out_indptr[i]:out_indptr[i+1]]
+    out_indptr = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(outdeg, out=out_indptr[1:])
+    out_indices = targets
+    
+    # CSC layout: incoming links of page i are in_indices[in_indptr[i]:in_indptr[i+1]]
+    order = np.argsort(out_indices, kind='stable')
+    in_indices = sources[order]
+    in_indptr = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(np.bincount(out_indices, minlength=n), out=in_indptr[1:])
+    
+    return out_indptr, out_indices, in_indptr, in_indices, outdeg, link_counts, page_ids
 
-def compute_statistics(graph, pages):
+def _summarize(counts):
+    """Summary statistics of a link count array, as plain Python numbers"""
+    return {
+        'average': float(counts.mean()),
+        'median': float(np.median(counts)),
+        'max': int(counts.max()),
+        'min': int(counts.min()),
+        # 'weibull' matches the exclusive method of statistics.quantiles
+        'quintiles': np.percentile(counts, [20, 40, 60, 80], method='weibull').tolist()
+    }
+
+def compute_statistics(in_indptr, link_counts):
     """Compute statistics on incoming and outgoing links"""
     print("\nComputing link statistics...")
     
-    outgoing_counts = [len(graph[page]) for page in pages]
-    incoming_counts = defaultdict(int)
-    
-    # Count incoming links
-    for page in pages:
-        for target in graph[page]:
-            incoming_counts[target] += 1
-    
-    incoming_values = [incoming_counts[page] for page in pages]
-    
-    # Compute statistics
+    # Outgoing counts every link in the HTML; in-degrees come straight from the CSC
     stats = {
-        'outgoing': {
-            'average': statistics.mean(outgoing_counts),
-            'median': statistics.median(outgoing_counts),
-            'max': max(outgoing_counts),
-            'min': min(outgoing_counts),
-            'quintiles': statistics.quantiles(outgoing_counts, n=5)
-        },
-        'incoming': {
-            'average': statistics.mean(incoming_values),
-            'median': statistics.median(incoming_values),
-            'max': max(incoming_values),
-            'min': min(incoming_values),
-            'quintiles': statistics.quantiles(incoming_values, n=5)
-        }
+        'outgoing': _summarize(link_counts),
+        'incoming': _summarize(np.diff(in_indptr))
     }
     
     return stats
 
-def compute_pagerank(graph, pages, damping=0.85, tolerance=0.005, max_iterations=100):
+@njit(parallel=True, cache=True, fastmath=True)
+def _pagerank_iter(in_indptr, in_indices, inv_outdeg, pr, out, base, damping):
+    """One PageRank step over the CSC graph, written into out
+    
+    Target pages are independent, so the outer loop runs across Numba threads.
+    Returns the L1 change sum(|out - pr|), accumulated in the same pass.
+    """
+    n = out.shape[0]
+    change = 0.0
+    for v in prange(n):
+        s = 0.0
+        for k in range(in_indptr[v], in_indptr[v + 1]):
+            u = in_indices[k]
+            s += pr[u] * inv_outdeg[u]
+        out[v] = base + damping * s
+        change += abs(out[v] - pr[v])
+    return change
+
+def compute_pagerank(in_indptr, in_indices, outdeg, damping=0.85, tolerance=1e-6, max_iterations=100, dtype=np.float32):
     """
     Compute PageRank using iterative algorithm with dangling node handling:
     PR(A) = (1-d)/n + d * (dangling_sum/n + sum(PR(Ti)/C(Ti)))
@@ -152,77 +208,97 @@ def compute_pagerank(graph, pages, damping=0.85, tolerance=0.005, max_iterations
     - Ti are all pages pointing to page A
     - C(X) is the number of outgoing links from page X
     - dangling_sum is the sum of PageRank from nodes with no outgoing links
+    
+    Iteration stops once the L1 change sum(|PR_new - PR_old|) drops below tolerance.
+    
+    The graph is given in CSC form (in_indptr, in_indices) over dense page ids,
+    so one iteration is a sparse matrix-vector product. It runs in a Numba
+    kernel when Numba is installed and as a scipy.sparse product otherwise.
+    
+    Ranks are stored as dtype (float32 by default): values are ~1/n, well within
+    float32 precision for the tolerance used, and half the bytes per SpMV.
     """
     print("\nComputing PageRank...")
     
-    n = len(pages)
-    pagerank = {page: 1.0/n for page in pages}
+    n = len(outdeg)
+    # Two preallocated rank buffers, swapped after every iteration
+    pagerank = np.full(n, 1.0 / n, dtype=dtype)
+    new_pagerank = np.empty_like(pagerank)
+    inv_outdeg = np.where(outdeg > 0, 1.0 / np.maximum(outdeg, 1), 0.0).astype(dtype)
     
-    # Build incoming links map
-    incoming = defaultdict(list)
-    for page in pages:
-        for target in graph[page]:
-            incoming[target].append(page)
+    # Identify dangling nodes (nodes with no outgoing links) as a 0/1 mask
+    dangling = (outdeg == 0).astype(dtype)
+    print(f"Found {int(dangling.sum())} dangling nodes")
     
-    # Identify dangling nodes (nodes with no outgoing links)
-    dangling_nodes = [page for page in pages if len(graph[page]) == 0]
-    print(f"Found {len(dangling_nodes)} dangling nodes")
+    if HAVE_NUMBA:
+        print(f"Using Numba kernel with {get_num_threads()} threads")
+    else:
+        # Damped, transposed transition matrix: row v holds d/C(u) for every link u -> v
+        transition_t = sp.csr_matrix((damping * inv_outdeg[in_indices], in_indices, in_indptr), shape=(n, n), dtype=dtype)
+        residual = np.empty_like(pagerank)
     
     iteration = 0
     while iteration < max_iterations:
-        new_pagerank = {}
-        
         # Calculate dangling contribution (distribute evenly to all pages)
-        dangling_sum = sum(pagerank[page] for page in dangling_nodes)
+        dangling_sum = np.dot(pagerank, dangling)
         
-        for page in pages:
-            # Base probability + dangling contribution
-            rank = (1 - damping) / n + damping * (dangling_sum / n)
-            
-            # Add contributions from incoming links
-            for incoming_page in incoming[page]:
-                outgoing_count = len(graph[incoming_page])
-                if outgoing_count > 0:
-                    rank += damping * (pagerank[incoming_page] / outgoing_count)
-            
-            new_pagerank[page] = rank
+        # Base probability + dangling contribution is the same for every page
+        base = (1 - damping) / n + damping * (dangling_sum / n)
         
-        # Check convergence
-        total_old = sum(pagerank.values())
-        total_new = sum(new_pagerank.values())
-        change = abs(total_new - total_old) / total_old
+        # Each page sends PR/C along every outgoing edge; sum them per target.
+        # Convergence is checked on the L1 residual between iterations.
+        if HAVE_NUMBA:
+            change = _pagerank_iter(in_indptr, in_indices, inv_outdeg, pagerank, new_pagerank, base, damping)
+        else:
+            np.add(transition_t @ pagerank, base, out=new_pagerank)
+            np.subtract(new_pagerank, pagerank, out=residual)
+            change = np.abs(residual, out=residual).sum()
         
-        pagerank = new_pagerank
+        pagerank, new_pagerank = new_pagerank, pagerank
         iteration += 1
         
         if change < tolerance:
-            print(f"Converged after {iteration} iterations (change: {change:.6f})")
+            print(f"Converged after {iteration} iterations (change: {change:.2e})")
             break
         
         if iteration % 10 == 0:
-            print(f"Iteration {iteration}, change: {change:.6f}")
+            print(f"Iteration {iteration}, change: {change:.2e}")
     
     if iteration == max_iterations:
         print(f"Reached maximum iterations ({max_iterations})")
     
     return pagerank, iteration
 
+def positive_int(value):
+    """argparse type for integers >= 1"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value}")
+    return number
+
 def main():
     parser = argparse.ArgumentParser(description='PageRank analysis on GCS bucket')
     parser.add_argument('bucket_name', help='GCS bucket name (e.g., my-pagerank-bucket)')
-    parser.add_argument('--workers', type=int, default=20, help='Number of parallel workers for download (default: 20)')
+    parser.add_argument('--workers', type=int, default=64, help='Number of parallel workers for download (default: 64)')
+    parser.add_argument('--dtype', choices=['float32', 'float64'], default='float32', help='Floating point type for PageRank values (default: float32)')
+    parser.add_argument('--threads', type=positive_int, default=None, help='Number of threads for the Numba PageRank kernel (default: NUMBA_NUM_THREADS or all cores)')
     args = parser.parse_args()
     
+    if HAVE_NUMBA and args.threads is not None:
+        # Numba can't go above the pool size fixed by NUMBA_NUM_THREADS at startup
+        set_num_threads(min(args.threads, numba_config.NUMBA_NUM_THREADS))
+    
     overall_start = time.time()
     
-    # Download files
-    files_content = download_files_parallel(args.bucket_name, args.workers)
+    # Download and parse files
+    results = download_files_parallel(args.bucket_name, args.workers)
     
-    # Build graph
-    graph, incoming, pages = build_graph(files_content)
+    # Build graph, then drop the per-page link arrays: the CSR/CSC arrays hold every edge
+    out_indptr, out_indices, in_indptr, in_indices, outdeg, link_counts, page_ids = build_graph(results)
+    del results
     
     # Compute statistics
-    stats = compute_statistics(graph, pages)
+    stats = compute_statistics(in_indptr, link_counts)
     
     print("\n" + "="*60)
     print("LINK STATISTICS")
@@ -242,17 +318,17 @@ def main():
     print(f"  Quintiles: {[f'{q:.2f}' for q in stats['incoming']['quintiles']]}")
     
     # Compute PageRank
-    pagerank, iterations = compute_pagerank(graph, pages)
+    pagerank, iterations = compute_pagerank(in_indptr, in_indices, outdeg, dtype=np.dtype(args.dtype))
     
     # Get top 5 pages
-    top_5 = sorted(pagerank.items(), key=lambda x: x[1], reverse=True)[:5]
+    top_5 = [(page_ids[i], pagerank[i]) for i in np.argsort(pagerank)[::-1][:5]]
     
     print("\n" + "="*60)
     print("PAGERANK RESULTS")
     print("="*60)
-    print(f"\nTotal pages: {len(pages)}")
+    print(f"\nTotal pages: {len(page_ids)}")
     print(f"Iterations to convergence: {iterations}")
-    print(f"Sum of all PageRanks: {sum(pagerank.values()):.6f}")
+    print(f"Sum of all PageRanks: {pagerank.sum():.6f}")
     
     print("\nTop 5 Pages by PageRank:")
     for i, (page, rank) in enumerate(top_5, 1):
@@ -7,8 +7,8 @@ Independent of randomly generated files
 from collections import defaultdict
 import statistics
 
-def compute_pagerank_test(graph, pages, damping=0.85, tolerance=0.005, max_iterations=100):
-    """PageRank algorithm with dangling node handling"""
+def compute_pagerank_test(graph, pages, damping=0.85, tolerance=1e-6, max_iterations=100):
+    """PageRank algorithm with dangling node handling, returns (pagerank, iterations)"""
     n = len(pages)
     pagerank = {page: 1.0/n for page in pages}
     
@@ -40,10 +40,8 @@ def compute_pagerank_test(graph, pages, damping=0.85, tolerance=0.005, max_itera
             
             new_pagerank[page] = rank
         
-        # Check convergence
-        total_old = sum(pagerank.values())
-        total_new = sum(new_pagerank.values())
-        change = abs(total_new - total_old) / total_old
+        # Check convergence (L1 residual between iterations)
+        change = sum(abs(new_pagerank[page] - pagerank[page]) for page in pages)
         
         pagerank = new_pagerank
         iteration += 1
@@ -51,7 +49,7 @@ def compute_pagerank_test(graph, pages, damping=0.85, tolerance=0.005, max_itera
         if change < tolerance:
             break
     
-    return pagerank
+    return pagerank, iteration
 
 def test_simple_graph():
     """
@@ -72,7 +70,7 @@ def test_simple_graph():
     }
     pages = {'A', 'B', 'C', 'D'}
     
-    pagerank = compute_pagerank_test(graph, pages)
+    pagerank, _ = compute_pagerank_test(graph, pages)
     
     # Check sum equals 1
     total = sum(pagerank.values())
@@ -105,7 +103,7 @@ def test_linear_chain():
     }
     pages = {'A', 'B', 'C', 'D'}
     
-    pagerank = compute_pagerank_test(graph, pages)
+    pagerank, _ = compute_pagerank_test(graph, pages)
     
     total = sum(pagerank.values())
     print(f"Sum of PageRanks: {total:.6f}")
@@ -128,7 +126,7 @@ def test_complete_graph():
     graph = {node: [n for n in nodes if n != node] for node in nodes}
     pages = set(nodes)
     
-    pagerank = compute_pagerank_test(graph, pages)
+    pagerank, _ = compute_pagerank_test(graph, pages)
     
     total = sum(pagerank.values())
     print(f"Sum of PageRanks: {total:.6f}")
@@ -161,7 +159,7 @@ def test_all_dangling():
     }
     pages = {'A', 'B', 'C'}
     
-    pagerank = compute_pagerank_test(graph, pages)
+    pagerank, _ = compute_pagerank_test(graph, pages)
     
     total = sum(pagerank.values())
     print(f"Sum of PageRanks: {total:.6f}")
@@ -178,6 +176,32 @@ def test_all_dangling():
     
     print("✓ Test 4 PASSED\n")
 
+def test_converged_values():
+    """
+    Test that convergence is judged on the ranks themselves: the result must
+    match a long run of the same iteration on the simple 4-node graph
+    """
+    print("Test 5: Converged values match long-run reference")
+    print("-" * 40)
+    
+    graph = {
+        'A': ['B', 'C'],
+        'B': ['C'],
+        'C': ['A'],
+        'D': ['C']
+    }
+    pages = {'A', 'B', 'C', 'D'}
+    
+    pagerank, _ = compute_pagerank_test(graph, pages)
+    reference, _ = compute_pagerank_test(graph, pages, tolerance=0, max_iterations=1000)
+    
+    print("PageRank values (converged / reference):")
+    for page in sorted(pagerank.keys()):
+        print(f"  {page}: {pagerank[page]:.6f} / {reference[page]:.6f}")
+        assert abs(pagerank[page] - reference[page]) < 1e-5, f"{page} did not converge"
+    
+    print("✓ Test 5 PASSED\n")
+
 def main():
     print("="*50)
     print("PageRank Correctness Tests")
@@ -188,6 +212,7 @@ def main():
     test_linear_chain()
     test_complete_graph()
     test_all_dangling()
+    test_converged_values()
     
     print("="*50)
     print("All tests PASSED! ✓")
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Test the array-based graph, statistics and PageRank code in pagerank_analysis.py
+against the dict-based reference in test_pagerank.py and the statistics module
+"""
+
+import random
+import statistics
+import sys
+import types
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("scipy")
+
+try:
+    from google.cloud import storage  # noqa: F401
+except ImportError:
+    # Only the download path talks to GCS; stub the module so the rest imports
+    google = sys.modules.setdefault("google", types.ModuleType("google"))
+    cloud = types.ModuleType("google.cloud")
+    cloud.storage = types.ModuleType("google.cloud.storage")
+    google.cloud = cloud
+    sys.modules["google.cloud"] = cloud
+    sys.modules["google.cloud.storage"] = cloud.storage
+
+import pagerank_analysis as pa
+from test_pagerank import compute_pagerank_test
+
+NUMBA_INSTALLED = pa.HAVE_NUMBA
+
+def _random_graph():
+    """40 pages numbered 1..46 with gaps, linking to 0..49 (so some targets are missing)"""
+    rng = random.Random(0)
+    pages = [p for p in range(1, 47) if p % 7 != 0]
+    return {p: [rng.randrange(50) for _ in range(rng.randrange(0, 12))] for p in pages}
+
+# page number -> outgoing links, as they appear in the HTML
+GRAPHS = {
+    # The graphs from test_pagerank.py, with A, B, C, ... numbered 0, 1, 2, ...
+    'simple': {0: [1, 2], 1: [2], 2: [0], 3: [2]},
+    'linear_chain': {0: [1], 1: [2], 2: [3], 3: []},
+    'complete': {i: [j for j in range(5) if j != i] for i in range(5)},
+    'all_dangling': {0: [], 1: [], 2: []},
+    # Dense page ids 0..n-1 with links past the last page
+    'dense_missing': {0: [1, 9], 1: [0, 0], 2: [], 3: [0, 1, 2, 4]},
+    # Non-dense page ids with links to pages that were not downloaded
+    'sparse_missing': {3: [7, 10, 4], 7: [3, 42], 10: [10, 3, 3], 15: []},
+    'random': _random_graph(),
+}
+
+def _build(graph):
+    """Run build_graph on (page_id, int32 links) pairs, in scrambled order"""
+    results = [(page, np.array(links, dtype=np.int32)) for page, links in graph.items()]
+    random.Random(1).shuffle(results)
+    return pa.build_graph(results)
+
+def _downloaded_links(graph):
+    """The graph with links to pages that are not in it removed"""
+    return {page: [t for t in links if t in graph] for page, links in graph.items()}
+
+def test_build_graph_dense_ids():
+    """Pages already numbered 0..n-1: page number is the dense id, out-of-range links dropped"""
+    out_indptr, out_indices, in_indptr, in_indices, outdeg, link_counts, page_ids = _build(GRAPHS['dense_missing'])
+
+    assert page_ids.tolist() == [0, 1, 2, 3]
+    assert link_counts.tolist() == [2, 2, 0, 4]
+    assert outdeg.tolist() == [1, 2, 0, 3]
+    assert out_indptr.tolist() == [0, 1, 3, 3, 6]
+    assert out_indices.tolist() == [1, 0, 0, 0, 1, 2]
+    assert in_indptr.tolist() == [0, 3, 5, 6, 6]
+    assert in_indices.tolist() == [1, 1, 3, 0, 3, 3]
+    for array in (out_indptr, out_indices, in_indptr, in_indices, outdeg, link_counts):
+        assert array.dtype == np.int32
+
+def test_build_graph_remapped_ids():
+    """Pages with gaps in their numbering are mapped to dense ids with searchsorted"""
+    out_indptr, out_indices, in_indptr, in_indices, outdeg, link_counts, page_ids = _build(GRAPHS['sparse_missing'])
+
+    # Pages 3, 7, 10, 15 become dense ids 0, 1, 2, 3; links to 4 and 42 are dropped
+    assert page_ids.tolist() == [3, 7, 10, 15]
+    assert link_counts.tolist() == [3, 2, 3, 0]
+    assert outdeg.tolist() == [2, 1, 3, 0]
+    assert out_indptr.tolist() == [0, 2, 3, 6, 6]
+    assert out_indices.tolist() == [1, 2, 0, 2, 0, 0]
+    assert in_indptr.tolist() == [0, 3, 4, 6, 6]
+    assert in_indices.tolist() == [1, 2, 2, 0, 0, 2]
+
+def test_parse_links_out_of_range():
+    """Link numbers beyond int32 are kept as missing pages instead of raising"""
+    links = pa.parse_links(b'<a HREF="5.html"> <a HREF="99999999999.html"> <a HREF="2147483647.html">')
+
+    assert links.dtype == np.int32
+    assert links.tolist() == [5, pa._MISSING_PAGE, 2147483647]
+
+class _FakeBucket:
+    """Serves one body for every blob and counts the downloads"""
+
+    def __init__(self, body):
+        self.body = body
+        self.downloads = 0
+
+    def blob(self, name):
+        bucket = self
+
+        class _Blob:
+            def download_as_bytes(self, timeout):
+                bucket.downloads += 1
+                return bucket.body
+
+        return _Blob()
+
+def test_download_file_parses_once():
+    """An odd link is a parsing matter: the blob is downloaded once and the page kept"""
+    bucket = _FakeBucket(b'<a HREF="3.html"> <a HREF="99999999999.html">')
+
+    page_id, links = pa.download_file(bucket, "12.html")
+
+    assert bucket.downloads == 1
+    assert page_id == 12
+    assert links.tolist() == [3, pa._MISSING_PAGE]
+
+def test_download_file_rejects_bad_name():
+    """A non-numeric .html name fails right away, without downloading"""
+    bucket = _FakeBucket(b'')
+
+    with pytest.raises(ValueError, match="index.html"):
+        pa.download_file(bucket, "index.html")
+    assert bucket.downloads == 0
+
+@pytest.mark.parametrize("pages", [[0, 1, 2], [4, 8, 9]], ids=["dense", "remapped"])
+def test_build_graph_out_of_range_link(pages):
+    """A link beyond int32 counts in link_counts but is not a graph edge"""
+    first, second, third = pages
+    results = [
+        (first, pa.parse_links(f'<a HREF="{second}.html"> <a HREF="99999999999.html">'.encode())),
+        (second, pa.parse_links(f'<a HREF="{third}.html">'.encode())),
+        (third, pa.parse_links(b'')),
+    ]
+
+    out_indptr, out_indices, _, _, outdeg, link_counts, page_ids = pa.build_graph(results)
+
+    assert page_ids.tolist() == pages
+    assert link_counts.tolist() == [2, 1, 0]
+    assert outdeg.tolist() == [1, 1, 0]
+    assert out_indptr.tolist() == [0, 1, 2, 2]
+    assert out_indices.tolist() == [1, 2]
+
+@pytest.mark.parametrize("name", sorted(GRAPHS))
+def test_statistics_match_statistics_module(name):
+    """NumPy statistics (incl. 'weibull' quintiles) equal statistics.mean/median/quantiles"""
+    graph = GRAPHS[name]
+    pages = sorted(graph)
+    outgoing = [len(graph[page]) for page in pages]
+    incoming = [sum(links.count(page) for links in graph.values()) for page in pages]
+
+    _, _, in_indptr, _, _, link_counts, _ = _build(graph)
+    stats = pa.compute_statistics(in_indptr, link_counts)
+
+    for direction, counts in (('outgoing', outgoing), ('incoming', incoming)):
+        expected = {
+            'average': statistics.mean(counts),
+            'median': statistics.median(counts),
+            'max': max(counts),
+            'min': min(counts),
+            'quintiles': statistics.quantiles(counts, n=5)
+        }
+        for key, value in expected.items():
+            assert stats[direction][key] == pytest.approx(value), f"{direction} {key}"
+
+@pytest.mark.parametrize("use_numba", [True, False], ids=["numba", "scipy"])
+@pytest.mark.parametrize("dtype, rel", [(np.float32, 1e-5), (np.float64, 1e-9)], ids=["float32", "float64"])
+@pytest.mark.parametrize("name", sorted(GRAPHS))
+def test_pagerank_matches_reference(name, dtype, rel, use_numba, monkeypatch):
+    """Both backends, in both dtypes, agree with compute_pagerank_test"""
+    if use_numba and not NUMBA_INSTALLED:
+        pytest.skip("numba is not installed")
+    monkeypatch.setattr(pa, "HAVE_NUMBA", use_numba)
+
+    graph = GRAPHS[name]
+    # Links to pages that were not downloaded don't carry rank (see build_graph)
+    reference, _ = compute_pagerank_test(_downloaded_links(graph), set(graph), tolerance=0, max_iterations=200)
+
+    _, _, in_indptr, in_indices, outdeg, _, page_ids = _build(graph)
+    pagerank, iterations = pa.compute_pagerank(in_indptr, in_indices, outdeg, tolerance=0, max_iterations=200, dtype=dtype)
+
+    assert pagerank.dtype == dtype
+    assert iterations == 200
+    assert float(pagerank.sum()) == pytest.approx(1.0, rel=rel)
+    for i, page in enumerate(page_ids.tolist()):
+        assert pagerank[i] == pytest.approx(reference[page], rel=rel), f"page {page}"
+
+@pytest.mark.parametrize("use_numba", [True, False], ids=["numba", "scipy"])
+@pytest.mark.parametrize("dtype", [np.float32, np.float64], ids=["float32", "float64"])
+@pytest.mark.parametrize("name", sorted(GRAPHS))
+def test_pagerank_stops_on_l1_residual(name, dtype, use_numba, monkeypatch):
+    """With the default tolerance, stop when the reference does and at converged ranks"""
+    if use_numba and not NUMBA_INSTALLED:
+        pytest.skip("numba is not installed")
+    monkeypatch.setattr(pa, "HAVE_NUMBA", use_numba)
+
+    graph = _downloaded_links(GRAPHS[name])
+    _, expected_iterations = compute_pagerank_test(graph, set(graph))
+    long_run, _ = compute_pagerank_test(graph, set(graph), tolerance=0, max_iterations=1000)
+
+    _, _, in_indptr, in_indices, outdeg, _, page_ids = _build(GRAPHS[name])
+    pagerank, iterations = pa.compute_pagerank(in_indptr, in_indices, outdeg, dtype=dtype)
+
+    if dtype == np.float64:
+        assert iterations == expected_iterations
+    else:
+        # float32 rounding (~3e-8 per rank) can push a residual sitting just under the
+        # tolerance over it, costing one more iteration, but never stopping early
+        assert expected_iterations <= iterations <= expected_iterations + 1
+    for i, page in enumerate(page_ids.tolist()):
+        assert pagerank[i] == pytest.approx(long_run[page], abs=1e-5), f"page {page}"
+
+@pytest.mark.parametrize("dtype, rel", [(np.float32, 1e-5), (np.float64, 1e-12)], ids=["float32", "float64"])
+def test_pagerank_iter_returns_l1_change(dtype, rel):
+    """The kernel writes one PageRank step into out and returns sum(|out - pr|)"""
+    graph = _downloaded_links(GRAPHS['random'])
+    _, _, in_indptr, in_indices, outdeg, _, page_ids = _build(graph)
+    n = len(outdeg)
+    damping, base = 0.85, 0.01
+
+    rng = np.random.default_rng(0)
+    pr = rng.random(n).astype(dtype)
+    pr /= pr.sum()
+    inv_outdeg = np.where(outdeg > 0, 1.0 / np.maximum(outdeg, 1), 0.0).astype(dtype)
+    out = np.empty_like(pr)
+
+    change = pa._pagerank_iter(in_indptr, in_indices, inv_outdeg, pr, out, base, damping)
+
+    # Same step written out edge by edge on the page-number graph
+    index = {page: i for i, page in enumerate(page_ids.tolist())}
+    expected = np.full(n, base)
+    for page, links in graph.items():
+        for target in links:
+            expected[index[target]] += damping * float(pr[index[page]]) / len(links)
+    assert out == pytest.approx(expected, rel=rel)
+    assert change == pytest.approx(float(np.abs(out.astype(np.float64) - pr).sum()), rel=rel)